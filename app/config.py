@@ -1,5 +1,6 @@
 """Environment configuration management."""
-from typing import Optional
+from typing import Literal, Optional, Tuple
+from pydantic import PrivateAttr, field_validator
 from pydantic_settings import BaseSettings
 
 
@@ -7,16 +8,40 @@ class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
     
     database_url: str = "sqlite:////data/app.db"
-    log_level: str = "INFO"
+    log_level: str = "WARNING"
     webhook_secret: Optional[str] = None
     
+    # SQLite durability; throwaway databases (tests) can use
+    # SQLITE_SYNCHRONOUS=OFF and SQLITE_JOURNAL_MODE=MEMORY
+    sqlite_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY", "OFF"] = "WAL"
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    
+    # (secret, encoded secret) so the key is only encoded when it changes
+    _webhook_secret_cache: Tuple[Optional[str], bytes] = PrivateAttr(default=(None, b""))
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
     
+    @field_validator("sqlite_journal_mode", "sqlite_synchronous", mode="before")
+    @classmethod
+    def _upper_pragma_value(cls, v):
+        """SQLite takes PRAGMA values in any case; accept e.g. SQLITE_JOURNAL_MODE=wal."""
+        return v.upper() if isinstance(v, str) else v
+    
     def validate_webhook_secret(self) -> bool:
         """Check if webhook secret is set and non-empty."""
         return self.webhook_secret is not None and len(self.webhook_secret) > 0
+    
+    @property
+    def webhook_secret_bytes(self) -> bytes:
+        """Webhook secret encoded as HMAC key bytes (empty if unset)."""
+        secret, encoded = self._webhook_secret_cache
+        if secret is not self.webhook_secret:
+            secret = self.webhook_secret
+            encoded = (secret or "").encode()
+            self._webhook_secret_cache = (secret, encoded)
+        return encoded
 
 
 # Global settings instance
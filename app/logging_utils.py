@@ -1,12 +1,11 @@
 """Structured JSON logging utilities."""
-import json
 import time
 import uuid
-from datetime import datetime
-from typing import Callable
-from fastapi import Request, Response
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.types import ASGIApp
+from typing import Any
+import orjson
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.routes.metrics import inc_req, request_latency_ms
+from app.timeutils import format_iso_z, now_iso_z
 import logging
 
 # Configure root logger to output JSON
@@ -14,44 +13,45 @@ logger = logging.getLogger()
 handler = logging.StreamHandler()
 
 # Set log level from environment (will be updated in main.py)
-def configure_logging(level: str = "INFO"):
-    """Configure logging level."""
-    log_level = getattr(logging, level.upper(), logging.INFO)
+def configure_logging(level: str = "WARNING"):
+    """Configure logging level (WARNING unless INFO/DEBUG is requested)."""
+    log_level = getattr(logging, level.upper(), logging.WARNING)
     logger.setLevel(log_level)
     handler.setLevel(log_level)
 
 configure_logging()
 
 
+# Optional fields copied from the log record when present
+EXTRA_FIELDS = (
+    "request_id",
+    "method",
+    "path",
+    "status",
+    "latency_ms",
+    "message_id",
+    "dup",
+    "result",
+)
+
+
 class JSONFormatter(logging.Formatter):
     """Custom formatter that outputs JSON logs."""
     
     def format(self, record: logging.LogRecord) -> str:
         log_data = {
-            "ts": datetime.utcnow().isoformat() + "Z",
+            "ts": format_iso_z(record.created),
             "level": record.levelname,
             "message": record.getMessage(),
         }
         
         # Add extra fields if present
-        if hasattr(record, "request_id"):
-            log_data["request_id"] = record.request_id
-        if hasattr(record, "method"):
-            log_data["method"] = record.method
-        if hasattr(record, "path"):
-            log_data["path"] = record.path
-        if hasattr(record, "status"):
-            log_data["status"] = record.status
-        if hasattr(record, "latency_ms"):
-            log_data["latency_ms"] = record.latency_ms
-        if hasattr(record, "message_id"):
-            log_data["message_id"] = record.message_id
-        if hasattr(record, "dup"):
-            log_data["dup"] = record.dup
-        if hasattr(record, "result"):
-            log_data["result"] = record.result
+        record_dict = record.__dict__
+        for field in EXTRA_FIELDS:
+            if field in record_dict:
+                log_data[field] = record_dict[field]
         
-        return json.dumps(log_data)
+        return orjson.dumps(log_data).decode()
 
 
 handler.setFormatter(JSONFormatter())
@@ -59,51 +59,93 @@ logger.addHandler(handler)
 logger.propagate = False
 
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware to log requests in JSON format."""
+def log_event(level: int, message: str, **fields: Any) -> None:
+    """
+    Write one JSON log line straight to the log handler's stream.
+    
+    Per-request logs skip the LogRecord -> Formatter -> Handler pipeline;
+    the output has the same shape as JSONFormatter. Pass extra fields in
+    EXTRA_FIELDS order to keep key order identical.
+    """
+    if level < handler.level:
+        return
+    
+    log_data = {
+        "ts": now_iso_z(),
+        "level": logging.getLevelName(level),
+        "message": message,
+    }
+    log_data.update(fields)
+    line = orjson.dumps(log_data, option=orjson.OPT_APPEND_NEWLINE)
+    
+    handler.acquire()
+    try:
+        # StreamHandler flushes after every record, so the text layer is
+        # empty and bytes can go to the underlying buffer directly
+        buffer = getattr(handler.stream, "buffer", None)
+        if buffer is not None:
+            buffer.write(line)
+            buffer.flush()
+        else:
+            handler.stream.write(line.decode())
+            handler.stream.flush()
+    except (OSError, ValueError):
+        # Logging must never fail the request
+        pass
+    finally:
+        handler.release()
+
+
+# Metrics path label for requests that matched no route
+UNMATCHED_PATH_LABEL = "unmatched"
+
+
+class LoggingMiddleware:
+    """Pure ASGI middleware to log requests in JSON format."""
     
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        request_id = str(uuid.uuid4())
-        start_time = time.time()
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+    
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
         
-        # Store request_id in request state
-        request.state.request_id = request_id
+        request_id = uuid.uuid4().hex
+        start_time = time.perf_counter()
+        status_code = 500
         
-        # Process request
-        response = await call_next(request)
+        # Store request_id in request state (read back via request.state)
+        scope.setdefault("state", {})["request_id"] = request_id
         
-        # Calculate latency
-        latency_ms = int((time.time() - start_time) * 1000)
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
         
-        # Track metrics
         try:
-            from app.routes.metrics import http_requests_total, request_latency_ms
-            http_requests_total.labels(
-                path=request.url.path,
-                status=response.status_code
-            ).inc()
+            # Process request
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # Calculate latency
+            latency_ms = int((time.perf_counter() - start_time) * 1000)
+            
+            # Label by route template (set by the router) so label
+            # cardinality stays bounded whatever paths clients send
+            route = scope.get("route")
+            path_label = route.path if route is not None else UNMATCHED_PATH_LABEL
+            
+            # Track metrics
+            inc_req(path_label, status_code)
             request_latency_ms.observe(latency_ms)
-        except Exception:
-            # Metrics might not be initialized yet, ignore
-            pass
-        
-        # Create log record
-        log_record = logging.LogRecord(
-            name="http",
-            level=logging.INFO,
-            pathname="",
-            lineno=0,
-            msg="",
-            args=(),
-            exc_info=None,
-        )
-        log_record.request_id = request_id
-        log_record.method = request.method
-        log_record.path = request.url.path
-        log_record.status = response.status_code
-        log_record.latency_ms = latency_ms
-        
-        logger.handle(log_record)
-        
-        return response
-
+            
+            log_event(
+                logging.INFO,
+                "",
+                request_id=request_id,
+                method=scope["method"],
+                path=scope["path"],
+                status=status_code,
+                latency_ms=latency_ms,
+            )
@@ -1,10 +1,14 @@
 """FastAPI application entry point."""
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
+from starlette.middleware.gzip import GZipMiddleware
 from app.config import settings
 from app.models import init_db
 from app.logging_utils import LoggingMiddleware
+from app.writer import writer
 from app.routes import health, webhook, messages, stats, metrics
 import logging
+import ssl
 
 # Initialize logger
 logger = logging.getLogger(__name__)
@@ -21,8 +25,13 @@ app = FastAPI(
     title="WhatsApp-like Message Service",
     description="Production-style FastAPI service for ingesting and querying messages",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
 )
 
+# Compress large responses (/messages, /stats, /metrics). Added before the
+# logging middleware so it sits inside it and the logger sees the final response.
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # Add logging middleware
 app.add_middleware(LoggingMiddleware)
 
@@ -34,14 +43,34 @@ app.include_router(stats.router)
 app.include_router(metrics.router)
 
 
+def log_hmac_backend():
+    """Report whether webhook HMAC-SHA256 can use hardware SHA instructions."""
+    if ssl.OPENSSL_VERSION_INFO < (1, 1, 1):
+        logger.warning(
+            f"{ssl.OPENSSL_VERSION} is older than 1.1.1; "
+            "HMAC-SHA256 may not use CPU SHA extensions"
+        )
+    sha_ext = webhook.cpu_has_sha_extensions()
+    state = "unknown" if sha_ext is None else ("available" if sha_ext else "unavailable")
+    logger.info(f"HMAC-SHA256 via {ssl.OPENSSL_VERSION}, CPU SHA extensions {state}")
+
+
 @app.on_event("startup")
 async def startup_event():
     """Validate configuration on startup."""
     if not settings.validate_webhook_secret():
         logger.error("WEBHOOK_SECRET is not set or empty. Service will not be ready.")
+    log_hmac_backend()
+    writer.start()
     logger.info("Application started")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush pending webhook writes."""
+    await writer.stop()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
@@ -49,5 +78,8 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         log_config=None,  # We use our own JSON logging
+        loop="auto",  # uvloop when installed (not available on Windows)
+        http="httptools",
+        access_log=False,  # LoggingMiddleware already logs every request
     )
 
@@ -1,9 +1,37 @@
 """Database models and schema initialization."""
+import queue
 import sqlite3
+import threading
+import time
 from typing import Optional
 from contextlib import contextmanager
 from app.config import settings
 
+# Idle read-only connections kept around next to the single writer
+READER_POOL_SIZE = 4
+
+# Prepared statements kept per connection, keyed by SQL text
+CACHED_STATEMENTS = 128
+
+# Applied to every connection when it is opened, after the configurable
+# journal_mode and synchronous settings
+CONNECTION_PRAGMAS = (
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-64000",
+)
+
+# How long a successful readiness check is trusted
+READY_CACHE_SECONDS = 5.0
+
+_pool_lock = threading.Lock()
+_write_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+_readers: "queue.LifoQueue" = queue.LifoQueue()
+_ready_lock = threading.Lock()
+_ready_path: Optional[str] = None
+_ready_until = 0.0
+
 
 def get_db_path() -> str:
     """Extract database path from DATABASE_URL."""
@@ -13,54 +41,164 @@ def get_db_path() -> str:
     return settings.database_url.replace("sqlite://", "", 1)
 
 
+def _connect(db_path: str) -> sqlite3.Connection:
+    """
+    Open a connection with the service PRAGMAs applied.
+
+    Paths starting with "file:" are opened as SQLite URIs, e.g.
+    file:memdb1?mode=memory&cache=shared for a shared in-memory database.
+    """
+    conn = sqlite3.connect(
+        db_path,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=CACHED_STATEMENTS,
+        uri=db_path.startswith("file:"),
+    )
+    conn.row_factory = sqlite3.Row
+    conn.execute(f"PRAGMA journal_mode={settings.sqlite_journal_mode}")
+    conn.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    for pragma in CONNECTION_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def _close_readers():
+    """Close every idle reader connection in the pool."""
+    while True:
+        try:
+            _, reader = _readers.get_nowait()
+        except queue.Empty:
+            return
+        reader.close()
+
+
+def get_conn() -> sqlite3.Connection:
+    """
+    Return the shared writer connection.
+
+    The connection is opened lazily and reopened if DATABASE_URL changes.
+    """
+    global _conn, _conn_path
+    db_path = get_db_path()
+    if _conn is None or _conn_path != db_path:
+        with _pool_lock:
+            if _conn is None or _conn_path != db_path:
+                if _conn is not None:
+                    _conn.close()
+                _close_readers()
+                _conn = _connect(db_path)
+                _conn_path = db_path
+    return _conn
+
+
+def close_db():
+    """Close the shared writer and all pooled reader connections."""
+    global _conn, _conn_path
+    with _pool_lock:
+        if _conn is not None:
+            _conn.close()
+        _close_readers()
+        _conn = None
+        _conn_path = None
+
+
 @contextmanager
 def get_db_connection():
-    """Context manager for database connections."""
+    """Context manager for a write transaction on the shared connection."""
+    with _write_lock:
+        conn = get_conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+
+@contextmanager
+def get_read_connection():
+    """
+    Context manager lending a pooled read-only connection.
+
+    WAL mode lets readers run alongside the writer, so reads neither take
+    the write lock nor open a transaction.
+    """
     db_path = get_db_path()
-    conn = sqlite3.connect(db_path, check_same_thread=False)
-    conn.row_factory = sqlite3.Row
+    try:
+        reader_path, conn = _readers.get_nowait()
+        if reader_path != db_path:
+            conn.close()
+            conn = _connect(db_path)
+    except queue.Empty:
+        conn = _connect(db_path)
     try:
         yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
     finally:
-        conn.close()
+        if db_path == _conn_path and _readers.qsize() < READER_POOL_SIZE:
+            _readers.put((db_path, conn))
+        else:
+            conn.close()
+
+
+def apply_schema(conn: sqlite3.Connection):
+    """Create the messages table and its indexes if they don't exist."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            message_id TEXT PRIMARY KEY,
+            from_msisdn TEXT NOT NULL,
+            to_msisdn TEXT NOT NULL,
+            ts TEXT NOT NULL,
+            text TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+    # Index-ordered scans for ORDER BY ts, message_id and the from/since filters
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_msg_ts_id ON messages(ts, message_id)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_msg_from_ts ON messages(from_msisdn, ts)"
+    )
 
 
 def init_db():
     """Initialize database schema."""
     db_path = get_db_path()
-    
+
     # Ensure directory exists
     import os
-    db_dir = os.path.dirname(db_path)
+    db_dir = "" if db_path.startswith("file:") else os.path.dirname(db_path)
     if db_dir:  # Only create directory if path has a directory component
         os.makedirs(db_dir, exist_ok=True)
-    
+
     with get_db_connection() as conn:
-        cursor = conn.cursor()
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS messages (
-                message_id TEXT PRIMARY KEY,
-                from_msisdn TEXT NOT NULL,
-                to_msisdn TEXT NOT NULL,
-                ts TEXT NOT NULL,
-                text TEXT,
-                created_at TEXT NOT NULL
-            )
-        """)
-        conn.commit()
+        apply_schema(conn)
 
 
 def check_db_ready() -> bool:
-    """Check if database is accessible and schema exists."""
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='messages'")
-            return cursor.fetchone() is not None
-    except Exception:
-        return False
+    """
+    Check if database is accessible and schema exists.
+
+    A positive result is cached for READY_CACHE_SECONDS per database path;
+    failures are never cached, so the next probe re-checks immediately.
+    """
+    global _ready_path, _ready_until
+    db_path = get_db_path()
+    if _ready_path == db_path and time.monotonic() < _ready_until:
+        return True
+
+    with _ready_lock:
+        try:
+            with get_read_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='messages'")
+                ready = cursor.fetchone() is not None
+        except Exception:
+            ready = False
 
+        if ready:
+            _ready_path = db_path
+            _ready_until = time.monotonic() + READY_CACHE_SECONDS
+        return ready
@@ -1,8 +1,8 @@
 """Health check endpoints."""
-from fastapi import APIRouter, status, Response
+from fastapi import APIRouter, status
+from fastapi.responses import ORJSONResponse
 from app.config import settings
 from app.models import check_db_ready
-import json
 
 router = APIRouter()
 
@@ -10,7 +10,7 @@ router = APIRouter()
 @router.get("/health/live")
 async def liveness():
     """Liveness probe - always returns 200 once app is running."""
-    return {"status": "ok"}
+    return ORJSONResponse({"status": "ok"})
 
 
 @router.get("/health/ready")
@@ -21,18 +21,16 @@ async def readiness():
     - WEBHOOK_SECRET is set
     """
     if not settings.validate_webhook_secret():
-        return Response(
-            content=json.dumps({"status": "not ready", "reason": "WEBHOOK_SECRET not set"}),
+        return ORJSONResponse(
+            {"status": "not ready", "reason": "WEBHOOK_SECRET not set"},
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            media_type="application/json"
         )
     
     if not check_db_ready():
-        return Response(
-            content=json.dumps({"status": "not ready", "reason": "database not ready"}),
+        return ORJSONResponse(
+            {"status": "not ready", "reason": "database not ready"},
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            media_type="application/json"
         )
     
-    return {"status": "ready"}
+    return ORJSONResponse({"status": "ready"})
 
@@ -1,5 +1,6 @@
 """Messages listing endpoint with pagination and filters."""
 from fastapi import APIRouter, Query
+from fastapi.responses import ORJSONResponse
 from typing import Optional
 from app.storage import get_messages
 
@@ -34,10 +35,10 @@ async def list_messages(
         q=q,
     )
     
-    return {
+    return ORJSONResponse({
         "data": messages,
         "total": total,
         "limit": limit,
         "offset": offset,
-    }
+    })
 
@@ -1,4 +1,5 @@
 """Prometheus metrics endpoint."""
+from typing import Dict, Tuple
 from fastapi import APIRouter, Response
 from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
 
@@ -23,6 +24,19 @@ request_latency_ms = Histogram(
     buckets=[100, 500, 1000, 2000, 5000, float("inf")]
 )
 
+# http_requests_total children keyed by (path, status)
+_req_cache: Dict[Tuple[str, int], Counter] = {}
+
+
+def inc_req(path: str, status: int):
+    """Increment http_requests_total, reusing the labelled child per (path, status)."""
+    key = (path, status)
+    counter = _req_cache.get(key)
+    if counter is None:
+        counter = http_requests_total.labels(path=path, status=status)
+        _req_cache[key] = counter
+    counter.inc()
+
 
 @router.get("/metrics")
 async def metrics():
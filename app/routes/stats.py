@@ -1,5 +1,6 @@
 """Statistics endpoint for message analytics."""
 from fastapi import APIRouter
+from fastapi.responses import ORJSONResponse
 from app.storage import get_stats
 
 router = APIRouter()
@@ -17,5 +18,5 @@ async def stats():
     - first_message_ts: Timestamp of first message (null if none)
     - last_message_ts: Timestamp of last message (null if none)
     """
-    return get_stats()
+    return ORJSONResponse(get_stats())
 
@@ -1,47 +1,117 @@
 """Webhook endpoint for ingesting WhatsApp-like messages."""
 import hmac
-import hashlib
-from fastapi import APIRouter, Request, Response, Header, HTTPException, status
-from pydantic import BaseModel, Field, field_validator
+import orjson
+from fastapi import APIRouter, Request, Header, HTTPException, status
+from fastapi.responses import ORJSONResponse
+from datetime import datetime
 from typing import Optional
 from app.config import settings
-from app.storage import insert_message
+from app.logging_utils import log_event
+from app.routes.metrics import inc_req, webhook_requests_total
+from app.storage import MessageRow
+from app.writer import writer
 import logging
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
 
-class WebhookMessage(BaseModel):
-    """Pydantic model for webhook message validation."""
-    message_id: str = Field(..., min_length=1)
-    from_: str = Field(..., alias="from")
-    to: str
-    ts: str
-    text: Optional[str] = Field(None, max_length=4096)
-    
-    @field_validator("from_", "to")
-    @classmethod
-    def validate_msisdn(cls, v: str) -> str:
-        """Validate E.164-like format: starts with +, then digits only."""
-        if not v.startswith("+"):
-            raise ValueError("must start with +")
-        if not v[1:].isdigit():
-            raise ValueError("must contain only digits after +")
-        return v
-    
-    @field_validator("ts")
-    @classmethod
-    def validate_timestamp(cls, v: str) -> str:
-        """Validate ISO-8601 UTC timestamp with Z suffix."""
-        if not v.endswith("Z"):
-            raise ValueError("must end with Z")
-        try:
-            from datetime import datetime
-            datetime.fromisoformat(v.replace("Z", "+00:00"))
-        except ValueError:
-            raise ValueError("must be valid ISO-8601 UTC timestamp")
-        return v
+# Longest accepted message text
+MAX_TEXT_LENGTH = 4096
+
+# ASCII digits; deleting them with bytes.translate leaves only invalid bytes
+_DIGITS = b"0123456789"
+
+# Lowercase hex digits, checked the same way for X-Signature
+_HEX_DIGITS = b"0123456789abcdef"
+
+# Length of a hex-encoded SHA-256 digest
+SIGNATURE_HEX_LENGTH = 64
+
+
+def _validate_msisdn(field: str, v: object) -> str:
+    """Validate E.164-like format: starts with +, then digits only."""
+    if not isinstance(v, str):
+        raise ValueError(f"{field}: must be a string")
+    if not v.startswith("+"):
+        raise ValueError(f"{field}: must start with +")
+    digits = v[1:]
+    if not digits or not digits.isascii() or digits.encode("ascii").translate(None, _DIGITS):
+        raise ValueError(f"{field}: must contain only digits after +")
+    return v
+
+
+def _validate_timestamp(v: object) -> str:
+    """Validate ISO-8601 UTC timestamp with Z suffix."""
+    if not isinstance(v, str):
+        raise ValueError("ts: must be a string")
+    if not v.endswith("Z"):
+        raise ValueError("ts: must end with Z")
+    try:
+        parsed = datetime.fromisoformat(v[:-1])
+    except ValueError:
+        parsed = None
+    if parsed is None or parsed.tzinfo is not None:
+        raise ValueError("ts: must be valid ISO-8601 UTC timestamp")
+    return v
+
+
+def _validate_webhook(data: object) -> MessageRow:
+    """
+    Validate a decoded webhook payload.
+    
+    Plain checks instead of a pydantic model keep model construction and
+    alias resolution off the per-request path.
+    
+    Returns:
+        (message_id, from, to, ts, text)
+    
+    Raises:
+        ValueError: describing the first invalid field
+    """
+    if not isinstance(data, dict):
+        raise ValueError("body must be a JSON object")
+    
+    missing = [f for f in ("message_id", "from", "to", "ts") if f not in data]
+    if missing:
+        raise ValueError(f"missing required field(s): {', '.join(missing)}")
+    
+    message_id = data["message_id"]
+    if not isinstance(message_id, str) or not message_id:
+        raise ValueError("message_id: must be a non-empty string")
+    
+    text = data.get("text")
+    if text is not None:
+        if not isinstance(text, str):
+            raise ValueError("text: must be a string")
+        if len(text) > MAX_TEXT_LENGTH:
+            raise ValueError(f"text: must be at most {MAX_TEXT_LENGTH} characters")
+    
+    return (
+        message_id,
+        _validate_msisdn("from", data["from"]),
+        _validate_msisdn("to", data["to"]),
+        _validate_timestamp(data["ts"]),
+        text,
+    )
+
+
+def cpu_has_sha_extensions() -> Optional[bool]:
+    """
+    Check whether the CPU advertises SHA-256 instructions.
+    
+    Looks for the x86 `sha_ni` or ARMv8 `sha2` flag in /proc/cpuinfo.
+    Returns None when the information is not available (non-Linux hosts).
+    """
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith(("flags", "Features")):
+                    flags = line.split(":", 1)[1].split()
+                    return "sha_ni" in flags or "sha2" in flags
+    except OSError:
+        pass
+    return None
 
 
 def verify_signature(body: bytes, signature_header: Optional[str]) -> bool:
@@ -58,18 +128,27 @@ def verify_signature(body: bytes, signature_header: Optional[str]) -> bool:
     if not signature_header:
         return False
     
-    if not settings.webhook_secret:
+    secret = settings.webhook_secret_bytes
+    if not secret:
         return False
     
-    # Compute expected signature
-    expected_sig = hmac.new(
-        settings.webhook_secret.encode(),
-        body,
-        hashlib.sha256
-    ).hexdigest()
+    # Only the exact lowercase hexdigest is accepted; bytes.fromhex alone
+    # would also take uppercase digits and embedded whitespace
+    if (
+        len(signature_header) != SIGNATURE_HEX_LENGTH
+        or not signature_header.isascii()
+        or signature_header.encode("ascii").translate(None, _HEX_DIGITS)
+    ):
+        return False
+    
+    # Compare raw 32-byte digests rather than 64-char hex strings
+    provided_sig = bytes.fromhex(signature_header)
+    
+    # One-shot OpenSSL HMAC; OpenSSL picks SHA-NI/ARMv8 SHA2 at runtime
+    expected_sig = hmac.digest(secret, body, "sha256")
     
     # Constant-time comparison to prevent timing attacks
-    return hmac.compare_digest(expected_sig, signature_header)
+    return hmac.compare_digest(expected_sig, provided_sig)
 
 
 @router.post("/webhook")
@@ -89,25 +168,18 @@ async def webhook(
     # Verify signature
     if not verify_signature(body_bytes, x_signature):
         # Track metrics
-        from app.routes.metrics import http_requests_total, webhook_requests_total
-        http_requests_total.labels(path="/webhook", status=401).inc()
+        inc_req("/webhook", 401)
         webhook_requests_total.labels(result="invalid_signature").inc()
         # Log error
-        log_record = logging.LogRecord(
-            name="webhook",
-            level=logging.ERROR,
-            pathname="",
-            lineno=0,
-            msg="Invalid signature",
-            args=(),
-            exc_info=None,
+        log_event(
+            logging.ERROR,
+            "Invalid signature",
+            request_id=getattr(request.state, "request_id", "unknown"),
+            method=request.method,
+            path=request.url.path,
+            status=401,
+            result="invalid_signature",
         )
-        log_record.request_id = getattr(request.state, "request_id", "unknown")
-        log_record.method = request.method
-        log_record.path = request.url.path
-        log_record.status = 401
-        log_record.result = "invalid_signature"
-        logger.handle(log_record)
         
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -115,32 +187,25 @@ async def webhook(
         )
     
     # Parse and validate JSON
-    import json
+    data = None
     try:
-        data = json.loads(body_bytes.decode('utf-8'))
-        message = WebhookMessage(**data)
+        data = orjson.loads(body_bytes)
+        message = _validate_webhook(data)
     except Exception as e:
         # Log validation error
-        log_record = logging.LogRecord(
-            name="webhook",
-            level=logging.ERROR,
-            pathname="",
-            lineno=0,
-            msg=f"Validation error: {str(e)}",
-            args=(),
-            exc_info=None,
+        log_event(
+            logging.ERROR,
+            f"Validation error: {str(e)}",
+            request_id=getattr(request.state, "request_id", "unknown"),
+            method=request.method,
+            path=request.url.path,
+            status=422,
+            message_id=data.get("message_id", "unknown") if isinstance(data, dict) else "unknown",
+            result="validation_error",
         )
-        log_record.request_id = getattr(request.state, "request_id", "unknown")
-        log_record.method = request.method
-        log_record.path = request.url.path
-        log_record.status = 422
-        log_record.result = "validation_error"
-        log_record.message_id = data.get("message_id", "unknown") if isinstance(data, dict) else "unknown"
-        logger.handle(log_record)
         
         # Track metrics
-        from app.routes.metrics import http_requests_total, webhook_requests_total
-        http_requests_total.labels(path="/webhook", status=422).inc()
+        inc_req("/webhook", 422)
         webhook_requests_total.labels(result="validation_error").inc()
         
         raise HTTPException(
@@ -148,38 +213,25 @@ async def webhook(
             detail=str(e)
         )
     
-    # Insert message (handles idempotency)
-    is_new, result = insert_message(
-        message_id=message.message_id,
-        from_msisdn=message.from_,
-        to_msisdn=message.to,
-        ts=message.ts,
-        text=message.text,
-    )
+    # Insert message via the batched writer (handles idempotency)
+    is_new, result = await writer.insert(message)
     
     # Log webhook request
-    log_record = logging.LogRecord(
-        name="webhook",
-        level=logging.INFO,
-        pathname="",
-        lineno=0,
-        msg="Webhook processed",
-        args=(),
-        exc_info=None,
+    log_event(
+        logging.INFO,
+        "Webhook processed",
+        request_id=getattr(request.state, "request_id", "unknown"),
+        method=request.method,
+        path=request.url.path,
+        status=200,
+        message_id=message[0],
+        dup=not is_new,
+        result=result,
     )
-    log_record.request_id = getattr(request.state, "request_id", "unknown")
-    log_record.method = request.method
-    log_record.path = request.url.path
-    log_record.status = 200
-    log_record.result = result
-    log_record.message_id = message.message_id
-    log_record.dup = not is_new
-    logger.handle(log_record)
     
     # Track metrics
-    from app.routes.metrics import http_requests_total, webhook_requests_total
-    http_requests_total.labels(path="/webhook", status=200).inc()
+    inc_req("/webhook", 200)
     webhook_requests_total.labels(result=result).inc()
     
-    return {"status": "ok"}
+    return ORJSONResponse({"status": "ok"})
 
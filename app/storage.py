@@ -1,8 +1,11 @@
 """Database storage operations."""
-import sqlite3
-from datetime import datetime
+import functools
 from typing import List, Dict, Optional, Tuple
-from app.models import get_db_connection
+from app.models import get_db_connection, get_read_connection
+from app.timeutils import now_iso_z
+
+# Webhook payload as (message_id, from_msisdn, to_msisdn, ts, text)
+MessageRow = Tuple[str, str, str, str, Optional[str]]
 
 
 def insert_message(
@@ -18,24 +21,126 @@ def insert_message(
     Returns:
         (is_new, result) where is_new is True if inserted, False if duplicate
     """
-    created_at = datetime.utcnow().isoformat() + "Z"
+    created_at = now_iso_z()
+
+    # OR IGNORE turns a duplicate message_id into a no-op instead of an
+    # IntegrityError, so duplicates need no exception handling or rollback
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            INSERT OR IGNORE INTO messages (
+                message_id, from_msisdn, to_msisdn, ts, text, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            (message_id, from_msisdn, to_msisdn, ts, text, created_at),
+        )
+        if cursor.rowcount == 1:
+            return True, "created"
+        return False, "duplicate"
+
+
+def insert_messages(
+    rows: List[MessageRow],
+) -> List[bool]:
+    """
+    Insert a batch of messages in a single transaction.
 
-    try:
-        with get_db_connection() as conn:
-            cursor = conn.cursor()
+    Rows are executed one at a time rather than with executemany(), since
+    only a per-statement rowcount tells new rows apart from duplicates.
+
+    Args:
+        rows: (message_id, from_msisdn, to_msisdn, ts, text) tuples
+
+    Returns:
+        One is_new flag per row; False means the message_id already existed
+    """
+    created_at = now_iso_z()
+
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        results = []
+        for message_id, from_msisdn, to_msisdn, ts, text in rows:
             cursor.execute(
                 """
-                INSERT INTO messages (
+                INSERT OR IGNORE INTO messages (
                     message_id, from_msisdn, to_msisdn, ts, text, created_at
                 )
                 VALUES (?, ?, ?, ?, ?, ?)
                 """,
                 (message_id, from_msisdn, to_msisdn, ts, text, created_at),
             )
-            return True, "created"
+            results.append(cursor.rowcount == 1)
+        return results
 
-    except sqlite3.IntegrityError:
-        return False, "duplicate"
+
+def bulk_insert_messages(rows: List[MessageRow]) -> int:
+    """
+    Insert a batch of messages with one executemany() in a single transaction.
+
+    For callers that don't need to know which rows were duplicates;
+    duplicates are skipped as in insert_messages().
+
+    Returns:
+        Number of rows actually inserted
+    """
+    created_at = now_iso_z()
+
+    with get_db_connection() as conn:
+        cursor = conn.executemany(
+            """
+            INSERT OR IGNORE INTO messages (
+                message_id, from_msisdn, to_msisdn, ts, text, created_at
+            )
+            VALUES (?, ?, ?, ?, ?, ?)
+            """,
+            [(*row, created_at) for row in rows],
+        )
+        return cursor.rowcount
+
+
+@functools.lru_cache(maxsize=8)
+def _build_where_clause(has_from: bool, has_since: bool, has_q: bool) -> str:
+    """Build the WHERE clause for the active /messages filters."""
+    conditions = []
+
+    if has_from:
+        # ✅ use actual column name, not alias
+        conditions.append("from_msisdn = ?")
+
+    if has_since:
+        conditions.append("ts >= ?")
+
+    if has_q:
+        conditions.append("text LIKE ?")
+
+    return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+
+@functools.lru_cache(maxsize=8)
+def _build_messages_sql(has_from: bool, has_since: bool, has_q: bool) -> str:
+    """
+    Build the paged /messages query for the active filters.
+
+    Identical SQL text per filter combination lets the connection's
+    statement cache skip re-preparing the query.
+    """
+    where_clause = _build_where_clause(has_from, has_since, has_q)
+    # page data plus the total match count in one statement
+    # (select actual columns, alias in Python dict only)
+    return f"""
+        SELECT message_id,
+               from_msisdn,
+               to_msisdn,
+               ts,
+               text,
+               COUNT(*) OVER () AS total
+        FROM messages
+        {where_clause}
+        ORDER BY ts ASC, message_id ASC
+        LIMIT ? OFFSET ?
+    """
 
 
 def get_messages(
@@ -50,52 +155,38 @@ def get_messages(
     Ordered by ts ASC, message_id ASC.
     """
 
-    conditions = []
     params = []
 
     if from_msisdn:
-        # ✅ use actual column name, not alias
-        conditions.append("from_msisdn = ?")
         params.append(from_msisdn)
 
     if since:
-        conditions.append("ts >= ?")
         params.append(since)
 
     if q:
-        conditions.append("text LIKE ?")
         params.append(f"%{q}%")
 
-    where_clause = " WHERE " + " AND ".join(conditions) if conditions else ""
+    filters = (bool(from_msisdn), bool(since), bool(q))
 
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
 
-        # total count
-        cursor.execute(
-            f"SELECT COUNT(*) AS total FROM messages{where_clause}",
-            params,
-        )
-        total = cursor.fetchone()["total"]
-
-        # page data (select actual columns, alias in Python dict only)
-        cursor.execute(
-            f"""
-            SELECT message_id,
-                   from_msisdn,
-                   to_msisdn,
-                   ts,
-                   text
-            FROM messages
-            {where_clause}
-            ORDER BY ts ASC, message_id ASC
-            LIMIT ? OFFSET ?
-            """,
-            params + [limit, offset],
-        )
+        cursor.execute(_build_messages_sql(*filters), params + [limit, offset])
 
         rows = cursor.fetchall()
 
+        if rows:
+            total = rows[0]["total"]
+        elif offset:
+            # offset past the last match: no row carries the total
+            cursor.execute(
+                "SELECT COUNT(*) AS total FROM messages" + _build_where_clause(*filters),
+                params,
+            )
+            total = cursor.fetchone()["total"]
+        else:
+            total = 0
+
         messages = [
             {
                 "message_id": row["message_id"],
@@ -113,7 +204,7 @@ def get_messages(
 def get_stats() -> Dict:
     """Get message statistics."""
 
-    with get_db_connection() as conn:
+    with get_read_connection() as conn:
         cursor = conn.cursor()
 
         # Total messages
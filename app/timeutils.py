@@ -0,0 +1,35 @@
+"""Fast ISO-8601 UTC timestamps for logs and stored rows."""
+import time
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") for the most recently formatted second
+_last_second = (-1, "")
+
+
+def _format(sec: int, micros: int) -> str:
+    """Render whole seconds plus microseconds, reusing the cached prefix."""
+    global _last_second
+    cached_sec, prefix = _last_second
+    if sec != cached_sec:
+        prefix = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(sec))
+        _last_second = (sec, prefix)
+    return f"{prefix}.{micros:06d}Z"
+
+
+def format_iso_z(t: float) -> str:
+    """
+    Format a Unix timestamp as ISO-8601 UTC with microseconds and a Z suffix.
+
+    The date/time prefix is formatted once per second and reused, so most
+    calls only render the microsecond tail.
+    """
+    sec = int(t)
+    micros = round((t - sec) * 1_000_000)
+    if micros == 1_000_000:
+        sec, micros = sec + 1, 0
+    return _format(sec, micros)
+
+
+def now_iso_z() -> str:
+    """Current UTC time, e.g. 2025-01-15T10:00:00.123456Z."""
+    sec, nanos = divmod(time.time_ns(), 1_000_000_000)
+    return _format(sec, nanos // 1000)
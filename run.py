@@ -9,5 +9,8 @@ if __name__ == "__main__":
         port=8000,
         reload=True,  # Auto-reload on code changes
         log_config=None,  # Use our custom JSON logging
+        loop="auto",  # uvloop when installed (not available on Windows)
+        http="httptools",
+        access_log=False,  # LoggingMiddleware already logs every request
     )
 
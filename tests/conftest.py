@@ -1,43 +1,134 @@
 """Pytest configuration and fixtures."""
 import pytest
-import os
-import tempfile
+import hashlib
+import sqlite3
+import uuid
+import time
+from pathlib import Path
+import httpx
+from fastapi.testclient import TestClient
 from app.config import settings
-from app.models import init_db, get_db_path
+from app.main import app
+from app.models import apply_schema, close_db, get_db_path
+from app.storage import bulk_insert_messages
+from tests.live_server import BASE_URL, CLIENT, SECRET, close_connections
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "serial: order-dependent test that must not run under pytest-xdist (-m 'not serial')",
+    )
+
+
+@pytest.fixture(scope="session")
+def template_db():
+    """In-memory database holding the schema, built once and cloned from."""
+    conn = sqlite3.connect(":memory:")
+    apply_schema(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="session")
+def session_db(template_db):
+    """
+    In-memory database shared by the whole run, cloned from the template.
+
+    Returns a keeper connection that holds the shared-cache database open
+    even while the app's own connections are closed or pointed elsewhere.
+    """
+    db_url = f"sqlite:///file:memdb_{uuid.uuid4().hex}?mode=memory&cache=shared"
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(settings, "database_url", db_url)
+        keeper = sqlite3.connect(get_db_path(), uri=True, isolation_level=None)
+        template_db.backup(keeper)
+        yield keeper
+        close_db()
+        keeper.close()
 
 
 @pytest.fixture(scope="function")
-def test_db(monkeypatch):
-    """Create a temporary test database for each test."""
-    # Create a temporary database file
-    fd, db_path = tempfile.mkstemp(suffix='.db')
-    os.close(fd)
+def test_db(session_db):
+    """Give each test an empty messages table in the session database."""
+    yield get_db_path()
+    # Cheaper than a new database per test; no DDL, connections stay warm
+    session_db.execute("DELETE FROM messages")
+
+
+@pytest.fixture(scope="session")
+def seed_messages():
+    """Insert webhook-shaped message dicts directly, in one transaction."""
+    def seed(msgs):
+        bulk_insert_messages([
+            (m["message_id"], m["from"], m["to"], m["ts"], m.get("text")) for m in msgs
+        ])
+    return seed
+
+
+@pytest.fixture(autouse=True)
+def setup_test_env(monkeypatch, test_db):
+    """Set the webhook secret for each test; restored afterwards."""
+    # settings reads the environment only at import, so patch the attribute
+    monkeypatch.setattr(settings, "webhook_secret", SECRET)
+
+
+@pytest.fixture(scope="session")
+def client():
+    """One TestClient, and one app startup/shutdown, for the whole run."""
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(scope="session", autouse=True)
+def live_session():
+    """Close the live-server HTTP connections after the run."""
+    yield CLIENT
+    CLIENT.close()
+    close_connections()
+
+
+@pytest.fixture(scope="session")
+def live_server_ready(live_session):
+    """Wait once per run for the live server's /health/ready, with backoff."""
+    for delay in (0.05, 0.1, 0.2, 0.4, 0.8):
+        try:
+            if live_session.get("/health/ready").is_success:
+                return
+        except httpx.TransportError:
+            pass
+        time.sleep(delay)
+    pytest.fail(f"server at {BASE_URL} not ready")
+
+
+class WarmMarker:
+    """
+    Remembers, in pytest's cache dir, that the e2e seed rows were written.
+
+    The key covers the compose file and server URL, so a changed stack
+    definition invalidates it. Without the cache plugin nothing persists.
+    """
     
-    # Set the database URL to the temp file
-    db_url = f"sqlite:///{db_path}"
-    monkeypatch.setenv("DATABASE_URL", db_url)
-    settings.database_url = db_url
+    CACHE_KEY = "e2e_warm/seeded"
     
-    # Initialize the database
-    init_db()
+    def __init__(self, cache):
+        self.cache = cache
+        compose = Path(__file__).resolve().parent.parent / "docker-compose.yml"
+        digest = hashlib.sha1(BASE_URL.encode())
+        if compose.exists():
+            digest.update(compose.read_bytes())
+        self.key = digest.hexdigest()
     
-    yield db_path
+    @property
+    def warm(self) -> bool:
+        return self.cache is not None and self.cache.get(self.CACHE_KEY, None) == self.key
     
-    # Cleanup: remove the temporary database file
-    try:
-        os.unlink(db_path)
-    except Exception:
-        pass
+    def mark(self):
+        if self.cache is not None:
+            self.cache.set(self.CACHE_KEY, self.key)
 
 
-@pytest.fixture(autouse=True)
-def setup_test_env(monkeypatch, test_db):
-    """Set up test environment variables."""
-    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
-    monkeypatch.setenv("DATABASE_URL", settings.database_url)
-    monkeypatch.setenv("LOG_LEVEL", "INFO")
-    settings.webhook_secret = "testsecret"
-    yield
-    # Cleanup
-    settings.webhook_secret = None
-
+@pytest.fixture(scope="session")
+def e2e_warm(request):
+    """Marker for skipping idempotent e2e re-seeding against a warm stack."""
+    return WarmMarker(getattr(request.config, "cache", None))
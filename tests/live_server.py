@@ -0,0 +1,182 @@
+"""Shared HTTP client and signing helpers for the tests that run against a live server."""
+import hashlib
+import hmac
+import http.client
+import mmap
+import os
+import pickle
+import threading
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+import orjson
+
+BASE_URL = "http://localhost:8000"
+SECRET = "testsecret"
+SECRET_BYTES = SECRET.encode()
+
+# "+919876543210" encoded for ?from= (a bare + in a query string decodes
+# to a space), as quote(..., safe="") would produce
+ENCODED_FROM = "%2B919876543210"
+
+# Keep-alive pooling for the whole run instead of a new TCP connection per
+# request. uvicorn serves HTTP/1.1 only, so http2 would not be negotiated.
+LIMITS = httpx.Limits(max_keepalive_connections=8)
+CLIENT = httpx.Client(base_url=BASE_URL, timeout=5, limits=LIMITS)
+
+# Persistent raw connection per thread for the hot webhook POST path
+_URL = urlsplit(BASE_URL)
+_local = threading.local()
+_connections_lock = threading.Lock()
+_connections: List[http.client.HTTPConnection] = []
+
+
+class Resp(NamedTuple):
+    """Minimal response exposing the parts of httpx.Response the tests use."""
+    status_code: int
+    content: bytes
+
+    @property
+    def text(self) -> str:
+        return self.content.decode("utf-8", "replace")
+
+    def json(self):
+        return orjson.loads(self.content)
+
+
+def _connection() -> http.client.HTTPConnection:
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        conn = http.client.HTTPConnection(_URL.hostname, _URL.port, timeout=5)
+        _local.conn = conn
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def async_client() -> httpx.AsyncClient:
+    """New AsyncClient with the same base URL and pool limits as CLIENT."""
+    return httpx.AsyncClient(base_url=BASE_URL, timeout=5, limits=LIMITS)
+
+
+def close_connections():
+    """Close the raw connections opened by every thread."""
+    with _connections_lock:
+        for conn in _connections:
+            conn.close()
+
+
+def post_webhook_raw(body: bytes, sig: Optional[str]) -> Resp:
+    """
+    POST body to /webhook over a kept-alive http.client connection.
+
+    Skips the HTTP client's request building entirely. sig=None sends no
+    X-Signature header.
+    """
+    headers = {"Content-Type": "application/json"}
+    if sig is not None:
+        headers["X-Signature"] = sig
+    for attempt in (1, 2):
+        conn = _connection()
+        try:
+            conn.request("POST", "/webhook", body=body, headers=headers)
+            resp = conn.getresponse()
+            return Resp(resp.status, resp.read())
+        except (http.client.HTTPException, ConnectionError):
+            # Server closed the idle keep-alive connection; reconnect once
+            # (webhook POSTs are idempotent, so resending is safe)
+            conn.close()
+            if attempt == 2:
+                raise
+
+
+# HMAC-SHA256 (RFC 2104) inner and outer hash states with SECRET's padded
+# key already absorbed; signing copies them instead of re-keying
+_BLOCK_KEY = (
+    hashlib.sha256(SECRET_BYTES).digest() if len(SECRET_BYTES) > 64 else SECRET_BYTES
+).ljust(64, b"\0")
+_INNER = hashlib.sha256(bytes(b ^ 0x36 for b in _BLOCK_KEY))
+_OUTER = hashlib.sha256(bytes(b ^ 0x5C for b in _BLOCK_KEY))
+
+# X-Signature under SECRET, keyed by canonical JSON body
+_SIG_CACHE: Dict[bytes, str] = {}
+
+
+def canonical_json(body: dict) -> bytes:
+    """
+    Serialize a webhook body to the exact bytes the tests sign and send.
+
+    orjson emits compact UTF-8 bytes directly; sorted keys make equal dicts
+    serialize (and hit the signature cache) identically.
+    """
+    return orjson.dumps(body, option=orjson.OPT_SORT_KEYS)
+
+
+def sign(secret_bytes: bytes, body_bytes: bytes) -> str:
+    return hmac.new(secret_bytes, body_bytes, hashlib.sha256).hexdigest()
+
+
+def sign_fast(body: bytes) -> str:
+    """HMAC-SHA256 of body under SECRET, from the precomputed pad states."""
+    inner = _INNER.copy()
+    inner.update(body)
+    outer = _OUTER.copy()
+    outer.update(inner.digest())
+    return outer.hexdigest()
+
+
+def signature(body: bytes) -> str:
+    """Signature of body under SECRET, computed once per distinct body."""
+    sig = _SIG_CACHE.get(body)
+    if sig is None:
+        sig = sign_fast(body)
+        _SIG_CACHE[body] = sig
+    return sig
+
+
+# Pickled (body_bytes, signature, content_length) tables, one file per
+# name; not committed
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+
+# Bump when the table layout changes so stale pickles are rebuilt
+_FIXTURES_FORMAT = 2
+
+
+def load_fixtures(name: str, payloads: Dict[str, dict]) -> Dict[str, Tuple[bytes, str, str]]:
+    """
+    Return {key: (body_bytes, signature, content_length)} for fixed webhook payloads.
+
+    The table is read from FIXTURES_DIR/<name>.pkl via mmap and only rebuilt
+    (and rewritten atomically) when the payloads or SECRET change. Loaded
+    entries also seed the in-memory signature cache.
+    """
+    path = FIXTURES_DIR / f"{name}.pkl"
+    digest = hashlib.sha256(canonical_json(
+        {"format": _FIXTURES_FORMAT, "secret": SECRET, "payloads": payloads}
+    )).hexdigest()
+
+    fixtures = None
+    try:
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            cached_digest, cached = pickle.loads(mm)
+        if cached_digest == digest:
+            fixtures = cached
+    except (OSError, ValueError, EOFError, pickle.UnpicklingError):
+        pass
+
+    if fixtures is None:
+        fixtures = {}
+        for key, body in payloads.items():
+            body_bytes = canonical_json(body)
+            fixtures[key] = (body_bytes, sign_fast(body_bytes), str(len(body_bytes)))
+        FIXTURES_DIR.mkdir(exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump((digest, fixtures), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    for body_bytes, sig, _ in fixtures.values():
+        _SIG_CACHE[body_bytes] = sig
+    return fixtures
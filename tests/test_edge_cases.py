@@ -2,137 +2,64 @@
 Comprehensive edge case and validation error tests.
 Tests 422 validation errors, 401 auth errors, and error response formatting.
 """
-import json
-import hmac
-import hashlib
 import logging
-import requests
+import pytest
 
-BASE_URL = "http://localhost:8000"
-SECRET = "testsecret"
+from tests.live_server import (
+    CLIENT, canonical_json, post_webhook_raw, sign, signature,
+)
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("EDGE_CASE_TEST")
 
+pytestmark = pytest.mark.usefixtures("live_server_ready")
 
-def sign(secret: str, body: str) -> str:
-    return hmac.new(secret.encode(), body.encode(), hashlib.sha256).hexdigest()
+# Minimal valid payload; tests override or drop fields from it
+_BASE = {
+    "message_id": "m1",
+    "from": "+14155550100",
+    "to": "+14155550200",
+    "ts": "2025-01-15T10:00:00Z",
+}
 
+# Shared body for the 401 tests, which differ only in X-Signature
+_AUTH_BODY = {**_BASE, "text": "Hello"}
+_AUTH_BODY_JSON = canonical_json(_AUTH_BODY)
 
-def post_webhook(body: dict, valid=True, secret=SECRET):
-    body_json = json.dumps(body, separators=(",", ":"))
-    sig = sign(secret, body_json) if valid else "invalid_sig_123"
-    return requests.post(
-        f"{BASE_URL}/webhook",
-        data=body_json,
-        headers={"Content-Type": "application/json", "X-Signature": sig},
-        timeout=5,
-    )
+
+def post_webhook(body: dict):
+    body_bytes = canonical_json(body)
+    return post_webhook_raw(body_bytes, signature(body_bytes))
 
 
 # ============================================================================
 # VALIDATION ERROR TESTS (422)
 # ============================================================================
 
-def test_missing_message_id():
-    """Missing message_id → 422"""
-    r = post_webhook({"from": "+14155550100", "to": "+14155550200", "ts": "2025-01-15T10:00:00Z"})
-    assert r.status_code == 422
-
-
-def test_missing_from():
-    """Missing from → 422"""
-    r = post_webhook({"message_id": "m1", "to": "+14155550200", "ts": "2025-01-15T10:00:00Z"})
-    assert r.status_code == 422
-
-
-def test_missing_to():
-    """Missing to → 422"""
-    r = post_webhook({"message_id": "m1", "from": "+14155550100", "ts": "2025-01-15T10:00:00Z"})
-    assert r.status_code == 422
-
-
-def test_missing_ts():
-    """Missing ts → 422"""
-    r = post_webhook({"message_id": "m1", "from": "+14155550100", "to": "+14155550200"})
-    assert r.status_code == 422
-
-
-def test_empty_message_id():
-    """Empty message_id → 422"""
-    r = post_webhook({
-        "message_id": "",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    })
-    assert r.status_code == 422
-
-
-def test_from_without_plus():
-    """from without + → 422"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    })
+@pytest.mark.parametrize("drop", ["message_id", "from", "to", "ts"])
+def test_missing_field(drop):
+    """Missing required field → 422"""
+    r = post_webhook({k: v for k, v in _BASE.items() if k != drop})
     assert r.status_code == 422
 
 
-def test_from_with_non_digits():
-    """from with non-digits → 422"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+1415555ABC0",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    })
-    assert r.status_code == 422
-
-
-def test_to_without_plus():
-    """to without + → 422"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    })
-    assert r.status_code == 422
-
-
-def test_ts_without_z():
-    """ts without Z → 422"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00"
-    })
-    assert r.status_code == 422
-
-
-def test_ts_with_offset():
-    """ts with +05:30 instead of Z → 422"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00+05:30"
-    })
+@pytest.mark.parametrize("field,value", [
+    ("message_id", ""),                      # empty message_id
+    ("from", "14155550100"),                 # from without +
+    ("from", "+1415555ABC0"),                # from with non-digits
+    ("to", "14155550200"),                   # to without +
+    ("ts", "2025-01-15T10:00:00"),           # ts without Z
+    ("ts", "2025-01-15T10:00:00+05:30"),     # ts with offset instead of Z
+])
+def test_invalid_field(field, value):
+    """Malformed field value → 422"""
+    r = post_webhook({**_BASE, field: value})
     assert r.status_code == 422
 
 
 def test_text_exceeds_4096():
     """text > 4096 chars → 422"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "x" * 4097
-    })
+    r = post_webhook({**_BASE, "text": "x" * 4097})
     assert r.status_code == 422
 
 
@@ -142,60 +69,25 @@ def test_text_exceeds_4096():
 
 def test_invalid_signature():
     """Invalid X-Signature → 401"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "Hello"
-    }, valid=False)
+    r = post_webhook_raw(_AUTH_BODY_JSON, "invalid_sig_123")
     assert r.status_code == 401
 
 
 def test_missing_signature_header():
     """Missing X-Signature → 401"""
-    body_json = json.dumps({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "Hello"
-    }, separators=(",", ":"))
-    r = requests.post(
-        f"{BASE_URL}/webhook",
-        data=body_json,
-        headers={"Content-Type": "application/json"},
-        timeout=5,
-    )
+    r = post_webhook_raw(_AUTH_BODY_JSON, None)
     assert r.status_code == 401
 
 
 def test_wrong_secret():
     """Signature with wrong secret → 401"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "Hello"
-    }, valid=True, secret="wrong_secret")
+    r = post_webhook_raw(_AUTH_BODY_JSON, sign(b"wrong_secret", _AUTH_BODY_JSON))
     assert r.status_code == 401
 
 
 def test_empty_signature_header():
     """Empty X-Signature header → 401"""
-    body_json = json.dumps({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    }, separators=(",", ":"))
-    r = requests.post(
-        f"{BASE_URL}/webhook",
-        data=body_json,
-        headers={"Content-Type": "application/json", "X-Signature": ""},
-        timeout=5,
-    )
+    r = post_webhook_raw(_AUTH_BODY_JSON, "")
     assert r.status_code == 401
 
 
@@ -213,12 +105,7 @@ def test_422_has_detail_field():
 
 def test_401_has_detail_field():
     """401 error should have detail field"""
-    r = post_webhook({
-        "message_id": "m1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    }, valid=False)
+    r = post_webhook_raw(_AUTH_BODY_JSON, "invalid_sig_123")
     assert r.status_code == 401
     data = r.json()
     assert "detail" in data or len(r.text) > 0
@@ -237,57 +124,31 @@ def test_no_stack_traces():
 
 def test_text_max_length_ok():
     """text exactly 4096 chars → 200"""
-    r = post_webhook({
-        "message_id": "m_max",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "x" * 4096
-    })
+    r = post_webhook({**_BASE, "message_id": "m_max", "text": "x" * 4096})
     assert r.status_code == 200
 
 
 def test_text_optional():
     """text field is optional → 200"""
-    r = post_webhook({
-        "message_id": "m_no_text",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    })
+    r = post_webhook({**_BASE, "message_id": "m_no_text"})
     assert r.status_code == 200
 
 
 def test_very_old_timestamp():
     """Very old timestamp → 200"""
-    r = post_webhook({
-        "message_id": "m_old",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "1970-01-01T00:00:00Z"
-    })
+    r = post_webhook({**_BASE, "message_id": "m_old", "ts": "1970-01-01T00:00:00Z"})
     assert r.status_code == 200
 
 
 def test_future_timestamp():
     """Future timestamp → 200"""
-    r = post_webhook({
-        "message_id": "m_future",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2099-12-31T23:59:59Z"
-    })
+    r = post_webhook({**_BASE, "message_id": "m_future", "ts": "2099-12-31T23:59:59Z"})
     assert r.status_code == 200
 
 
 def test_long_message_id():
     """Very long message_id → 200"""
-    r = post_webhook({
-        "message_id": "m" * 255,
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    })
+    r = post_webhook({**_BASE, "message_id": "m" * 255})
     assert r.status_code == 200
 
 
@@ -297,12 +158,7 @@ def test_long_message_id():
 
 def test_duplicate_message_idempotent():
     """Duplicate message_id → 200 both times (idempotent)"""
-    body = {
-        "message_id": "idem_test_1",
-        "from": "+14155550100",
-        "to": "+14155550200",
-        "ts": "2025-01-15T10:00:00Z"
-    }
+    body = {**_BASE, "message_id": "idem_test_1"}
     r1 = post_webhook(body)
     r2 = post_webhook(body)
     assert r1.status_code == 200
@@ -310,23 +166,12 @@ def test_duplicate_message_idempotent():
 
 
 # ============================================================================
-# HEALTH & METRICS
+# HEALTH
 # ============================================================================
+# /health/ready is awaited once per run by the live_server_ready fixture and
+# /metrics is checked by test_full_stack_e2e.
 
 def test_health_live():
     """Health /live endpoint"""
-    r = requests.get(f"{BASE_URL}/health/live", timeout=5)
-    assert r.status_code == 200
-
-
-def test_health_ready():
-    """Health /ready endpoint"""
-    r = requests.get(f"{BASE_URL}/health/ready", timeout=5)
-    assert r.status_code == 200
-
-
-def test_metrics_endpoint():
-    """Metrics endpoint exists"""
-    r = requests.get(f"{BASE_URL}/metrics", timeout=5)
+    r = CLIENT.get("/health/live")
     assert r.status_code == 200
-    assert len(r.text) > 0
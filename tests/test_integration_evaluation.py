@@ -1,60 +1,14 @@
 """Integration test matching the evaluation script."""
-import pytest
-import hmac
-import hashlib
-import json
-import os
-import tempfile
-from urllib.parse import quote
-from fastapi.testclient import TestClient
-from app.main import app
-from app.config import settings
-from app.models import init_db
 from app.storage import get_messages, get_stats
+from tests.live_server import ENCODED_FROM, signature
 
 
-@pytest.fixture(scope="function")
-def test_db(monkeypatch):
-    """Create a temporary test database."""
-    fd, db_path = tempfile.mkstemp(suffix='.db')
-    os.close(fd)
-    
-    db_url = f"sqlite:///{db_path}"
-    monkeypatch.setenv("DATABASE_URL", db_url)
-    settings.database_url = db_url
-    
-    init_db()
-    
-    yield db_path
-    
-    try:
-        os.unlink(db_path)
-    except Exception:
-        pass
-
-
-@pytest.fixture(autouse=True)
-def setup_test_env(monkeypatch, test_db):
-    """Set up test environment matching evaluation script."""
-    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
-    monkeypatch.setenv("DATABASE_URL", "sqlite:////data/app.db")
-    settings.webhook_secret = "testsecret"
-    yield
-    settings.webhook_secret = None
+# The evaluation script's exact request body, and its signature
+_BODY_M1 = b'{"message_id":"m1","from":"+919876543210","to":"+14155550100","ts":"2025-01-15T10:00:00Z","text":"Hello"}'
+_SIG_M1 = signature(_BODY_M1)
 
 
-@pytest.fixture
-def client():
-    """Create test client."""
-    return TestClient(app)
-
-
-def compute_signature(secret: str, body: bytes) -> str:
-    """Compute HMAC-SHA256 signature."""
-    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
-
-
-def test_evaluation_script_flow(client):
+def test_evaluation_script_flow(client, seed_messages):
     """
     Complete integration test matching the evaluation script flow.
     This simulates the entire evaluation process.
@@ -68,23 +22,19 @@ def test_evaluation_script_flow(client):
     assert response.status_code == 200
     
     # Step 2: Webhook + Signature tests
-    body_str = '{"message_id":"m1","from":"+919876543210","to":"+14155550100","ts":"2025-01-15T10:00:00Z","text":"Hello"}'
-    body_bytes = body_str.encode()
-    
     # Invalid signature → expect 401
     response = client.post(
         "/webhook",
-        content=body_bytes,
+        content=_BODY_M1,
         headers={"X-Signature": "123", "Content-Type": "application/json"}
     )
     assert response.status_code == 401
     
     # Valid signature → 200, row inserted
-    valid_sig = compute_signature("testsecret", body_bytes)
     response = client.post(
         "/webhook",
-        content=body_bytes,
-        headers={"X-Signature": valid_sig, "Content-Type": "application/json"}
+        content=_BODY_M1,
+        headers={"X-Signature": _SIG_M1, "Content-Type": "application/json"}
     )
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
@@ -96,8 +46,8 @@ def test_evaluation_script_flow(client):
     # Duplicate with same body + sig → 200, but no new row
     response = client.post(
         "/webhook",
-        content=body_bytes,
-        headers={"X-Signature": valid_sig, "Content-Type": "application/json"}
+        content=_BODY_M1,
+        headers={"X-Signature": _SIG_M1, "Content-Type": "application/json"}
     )
     assert response.status_code == 200
     
@@ -115,15 +65,7 @@ def test_evaluation_script_flow(client):
          "ts": "2025-01-15T10:30:00Z", "text": "Hello again"}
     ]
     
-    for msg in additional_messages:
-        body = json.dumps(msg).encode()
-        signature = compute_signature("testsecret", body)
-        response = client.post(
-            "/webhook",
-            content=body,
-            headers={"X-Signature": signature, "Content-Type": "application/json"}
-        )
-        assert response.status_code == 200
+    seed_messages(additional_messages)
     
     # Step 4: Check /messages pagination & filters
     # Basic list
@@ -144,8 +86,7 @@ def test_evaluation_script_flow(client):
     assert data["total"] == 4
     
     # filter by from= (URL encode the + sign)
-    encoded_from = quote("+919876543210", safe="")
-    response = client.get(f"/messages?from={encoded_from}")
+    response = client.get(f"/messages?from={ENCODED_FROM}")
     assert response.status_code == 200
     data = response.json()
     assert data["total"] == 3  # m1, m2, m4
@@ -1,11 +1,4 @@
 """Tests for stats endpoint."""
-import pytest
-from fastapi.testclient import TestClient
-from app.main import app
-
-@pytest.fixture
-def client():
-    return TestClient(app)
 
 
 def test_stats_empty(client):
@@ -1,65 +1,39 @@
 """Tests for webhook endpoint."""
 import pytest
-import hmac
-import hashlib
-import json
-from fastapi.testclient import TestClient
-from app.main import app
+import orjson
+from app.config import settings
+from tests.live_server import sign, signature
 
-# Create client per test to avoid state issues
-@pytest.fixture
-def client():
-    return TestClient(app)
 
+# The canonical valid payload, serialized and signed once at import
+_VALID_MSG = {
+    "message_id": "m1",
+    "from": "+919876543210",
+    "to": "+14155550100",
+    "ts": "2025-01-15T10:00:00Z",
+    "text": "Hello",
+}
+_VALID_BODY = orjson.dumps(_VALID_MSG)
+_VALID_SIG = signature(_VALID_BODY)
 
-def compute_signature(secret: str, body: bytes) -> str:
-    """Compute HMAC-SHA256 signature."""
-    return hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
 
-
-@pytest.fixture
-def valid_message():
-    """Valid message payload."""
-    return {
-        "message_id": "m1",
-        "from": "+919876543210",
-        "to": "+14155550100",
-        "ts": "2025-01-15T10:00:00Z",
-        "text": "Hello"
-    }
-
-
-def test_webhook_valid_signature(valid_message, monkeypatch, client):
+def test_webhook_valid_signature(client):
     """Test webhook with valid signature."""
-    # Set webhook secret
-    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
-    from app.config import settings
-    settings.webhook_secret = "testsecret"
-    
-    body = json.dumps(valid_message).encode()
-    signature = compute_signature("testsecret", body)
-    
     response = client.post(
         "/webhook",
-        content=body,
-        headers={"X-Signature": signature, "Content-Type": "application/json"}
+        content=_VALID_BODY,
+        headers={"X-Signature": _VALID_SIG, "Content-Type": "application/json"}
     )
     
     assert response.status_code == 200
     assert response.json() == {"status": "ok"}
 
 
-def test_webhook_invalid_signature(valid_message, monkeypatch, client):
+def test_webhook_invalid_signature(client):
     """Test webhook with invalid signature."""
-    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
-    from app.config import settings
-    settings.webhook_secret = "testsecret"
-    
-    body = json.dumps(valid_message).encode()
-    
     response = client.post(
         "/webhook",
-        content=body,
+        content=_VALID_BODY,
         headers={"X-Signature": "invalid", "Content-Type": "application/json"}
     )
     
@@ -67,56 +41,57 @@ def test_webhook_invalid_signature(valid_message, monkeypatch, client):
     assert response.json() == {"detail": "invalid signature"}
 
 
-def test_webhook_missing_signature(valid_message, monkeypatch, client):
-    """Test webhook with missing signature."""
-    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
-    from app.config import settings
-    settings.webhook_secret = "testsecret"
-    
-    body = json.dumps(valid_message).encode()
+@pytest.mark.parametrize("header", [
+    _VALID_SIG.upper(),  # uppercase hex
+    " ".join(_VALID_SIG[i:i + 2] for i in range(0, 64, 2)),  # spaced byte pairs
+    _VALID_SIG + " ",  # trailing whitespace
+])
+def test_webhook_rejects_non_canonical_signature(client, header):
+    """Test only the exact lowercase hexdigest is accepted."""
+    response = client.post(
+        "/webhook",
+        content=_VALID_BODY,
+        headers={"X-Signature": header, "Content-Type": "application/json"}
+    )
     
+    assert response.status_code == 401
+
+
+def test_webhook_missing_signature(client):
+    """Test webhook with missing signature."""
     response = client.post(
         "/webhook",
-        content=body,
+        content=_VALID_BODY,
         headers={"Content-Type": "application/json"}
     )
     
     assert response.status_code == 401
 
 
-def test_webhook_duplicate_message(valid_message, monkeypatch, client):
+def test_webhook_duplicate_message(client):
     """Test idempotency - duplicate message_id."""
-    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
-    from app.config import settings
-    settings.webhook_secret = "testsecret"
-    
-    body = json.dumps(valid_message).encode()
-    signature = compute_signature("testsecret", body)
-    
     # First request
     response1 = client.post(
         "/webhook",
-        content=body,
-        headers={"X-Signature": signature, "Content-Type": "application/json"}
+        content=_VALID_BODY,
+        headers={"X-Signature": _VALID_SIG, "Content-Type": "application/json"}
     )
     assert response1.status_code == 200
+    assert response1.json() == {"status": "ok"}
     
     # Duplicate request
     response2 = client.post(
         "/webhook",
-        content=body,
-        headers={"X-Signature": signature, "Content-Type": "application/json"}
+        content=_VALID_BODY,
+        headers={"X-Signature": _VALID_SIG, "Content-Type": "application/json"}
     )
     assert response2.status_code == 200
-    assert response2.json() == {"status": "ok"}
+    # Same body as the first response; compare bytes instead of decoding again
+    assert response2.content == response1.content
 
 
-def test_webhook_validation_error(monkeypatch, client):
+def test_webhook_validation_error(client):
     """Test webhook with invalid payload."""
-    monkeypatch.setenv("WEBHOOK_SECRET", "testsecret")
-    from app.config import settings
-    settings.webhook_secret = "testsecret"
-    
     invalid_message = {
         "message_id": "",  # Empty message_id
         "from": "+919876543210",
@@ -124,14 +99,55 @@ def test_webhook_validation_error(monkeypatch, client):
         "ts": "2025-01-15T10:00:00Z",
     }
     
-    body = json.dumps(invalid_message).encode()
-    signature = compute_signature("testsecret", body)
+    body = orjson.dumps(invalid_message)
+    sig = signature(body)
     
     response = client.post(
         "/webhook",
         content=body,
-        headers={"X-Signature": signature, "Content-Type": "application/json"}
+        headers={"X-Signature": sig, "Content-Type": "application/json"}
     )
     
     assert response.status_code == 422
 
+
+
+def test_webhook_secret_change_is_picked_up(client, monkeypatch):
+    """Test the HMAC key follows updates to settings.webhook_secret."""
+    monkeypatch.setattr(settings, "webhook_secret", "rotatedsecret")
+    
+    response = client.post(
+        "/webhook",
+        content=_VALID_BODY,
+        headers={"X-Signature": _VALID_SIG, "Content-Type": "application/json"}
+    )
+    assert response.status_code == 401
+    
+    response = client.post(
+        "/webhook",
+        content=_VALID_BODY,
+        headers={"X-Signature": sign(b"rotatedsecret", _VALID_BODY), "Content-Type": "application/json"}
+    )
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize("payload", [
+    ["not", "an", "object"],
+    {"message_id": "m1", "from": "+91987654321٠", "to": "+14155550100", "ts": "2025-01-15T10:00:00Z"},
+    {"message_id": "m1", "from": "+", "to": "+14155550100", "ts": "2025-01-15T10:00:00Z"},
+    {"message_id": "m1", "from": "+919876543210", "to": None, "ts": "2025-01-15T10:00:00Z"},
+    {"message_id": "m1", "from": "+919876543210", "to": "+14155550100", "ts": "2025-01-15T10:00:00+05:30Z"},
+    {"message_id": "m1", "from": "+919876543210", "to": "+14155550100", "ts": "2025-01-15T10:00:00Z", "text": 5},
+])
+def test_webhook_rejects_malformed_fields(payload, client):
+    """Test webhook validation rejects wrong types and non-ASCII digits."""
+    body = orjson.dumps(payload)
+    sig = signature(body)
+    
+    response = client.post(
+        "/webhook",
+        content=body,
+        headers={"X-Signature": sig, "Content-Type": "application/json"}
+    )
+    
+    assert response.status_code == 422